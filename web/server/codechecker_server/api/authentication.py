@@ -365,7 +365,7 @@ class ThriftAuthHandler:
         with DBSession(self.__config_db) as session:
             token = generate_session_token()
             user = self.getLoggedInUser()
-            groups = ';'.join(self.__auth_session.groups)
+            groups = list(self.__auth_session.groups)
             session_token = Session(token, user, groups, description, False)
 
             session.add(session_token)
@@ -12,7 +12,7 @@ from datetime import datetime
 import sys
 
 from sqlalchemy import Boolean, CHAR, Column, DateTime, Enum, ForeignKey, \
-    Integer, MetaData, String, Text
+    Integer, JSON, MetaData, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.expression import false, true
 
@@ -121,11 +121,11 @@ class Session(Base):
 
     id = Column(Integer, autoincrement=True, primary_key=True)
 
-    user_name = Column(String)
+    user_name = Column(String, index=True)
     token = Column(CHAR(32), nullable=False, unique=True)
 
-    # List of group names separated by semicolons.
-    groups = Column(String)
+    # List of group names.
+    groups = Column(JSON)
 
     last_access = Column(DateTime, nullable=False)
 
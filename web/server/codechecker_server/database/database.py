@@ -21,7 +21,7 @@ import sqlalchemy
 from sqlalchemy import event
 from sqlalchemy.engine.url import URL, make_url
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, QueuePool
 
 from codechecker_api_shared.ttypes import DBStatus
 
@@ -386,9 +386,18 @@ class SQLServer(metaclass=ABCMeta):
         by create_engine.
         """
 
-    def create_engine(self):
+    def create_engine(self, pool_size=0, max_overflow=0, pool_recycle=-1):
         """
         Creates a new SQLAlchemy engine.
+
+        If pool_size is positive, at most this many idle connections of a
+        non-SQLite database are kept open in a connection pool and are reused
+        between sessions. At most max_overflow further connections are opened
+        when all of them are in use, and these are closed when released.
+        Pooled connections older than pool_recycle seconds are reconnected.
+
+        A pooled engine must not be used before forking worker processes, as
+        the pooled connections can not be shared between processes.
         """
 
         if make_url(self.get_connection_string()).drivername == \
@@ -401,6 +410,14 @@ class SQLServer(metaclass=ABCMeta):
                                               connect_args={'timeout': 600,
                                               'check_same_thread': False},
                                               poolclass=NullPool)
+        elif pool_size > 0:
+            engine = sqlalchemy.create_engine(self.get_connection_string(),
+                                              encoding='utf8',
+                                              poolclass=QueuePool,
+                                              pool_size=pool_size,
+                                              max_overflow=max_overflow,
+                                              pool_recycle=pool_recycle,
+                                              pool_pre_ping=True)
         else:
             engine = sqlalchemy.create_engine(self.get_connection_string(),
                                               encoding='utf8',
@@ -0,0 +1,26 @@
+"""
+Index session user name
+
+Revision ID: a3c5e1f7d962
+Revises:     f59dfe4623fa
+Create Date: 2026-10-15 10:12:41.208517
+"""
+
+from alembic import op
+
+
+# Revision identifiers, used by Alembic.
+revision = 'a3c5e1f7d962'
+down_revision = 'f59dfe4623fa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_auth_sessions_user_name'),
+                    'auth_sessions', ['user_name'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_auth_sessions_user_name'),
+                  table_name='auth_sessions')
@@ -0,0 +1,67 @@
+"""
+Store session groups as JSON
+
+Revision ID: c8e2d4b1f350
+Revises:     a3c5e1f7d962
+Create Date: 2026-10-15 11:03:27.514390
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Revision identifiers, used by Alembic.
+revision = 'c8e2d4b1f350'
+down_revision = 'a3c5e1f7d962'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    with op.batch_alter_table('auth_sessions') as batch_op:
+        batch_op.add_column(
+            sa.Column('groups_json', sa.JSON(), nullable=True))
+
+    sessions = sa.table('auth_sessions',
+                        sa.column('id', sa.Integer()),
+                        sa.column('groups', sa.String()),
+                        sa.column('groups_json', sa.JSON()))
+
+    # Convert the semicolon separated group names to JSON lists.
+    rows = conn.execute(
+        sa.select([sessions.c.id, sessions.c.groups])).fetchall()
+    for session_id, groups in rows:
+        conn.execute(sessions.update()
+                     .where(sessions.c.id == session_id)
+                     .values(groups_json=groups.split(';')
+                             if groups else []))
+
+    with op.batch_alter_table('auth_sessions') as batch_op:
+        batch_op.drop_column('groups')
+        batch_op.alter_column('groups_json', new_column_name='groups')
+
+
+def downgrade():
+    conn = op.get_bind()
+
+    with op.batch_alter_table('auth_sessions') as batch_op:
+        batch_op.add_column(
+            sa.Column('groups_str', sa.String(), nullable=True))
+
+    sessions = sa.table('auth_sessions',
+                        sa.column('id', sa.Integer()),
+                        sa.column('groups', sa.JSON()),
+                        sa.column('groups_str', sa.String()))
+
+    rows = conn.execute(
+        sa.select([sessions.c.id, sessions.c.groups])).fetchall()
+    for session_id, groups in rows:
+        conn.execute(sessions.update()
+                     .where(sessions.c.id == session_id)
+                     .values(groups_str=';'.join(groups or [])))
+
+    with op.batch_alter_table('auth_sessions') as batch_op:
+        batch_op.drop_column('groups')
+        batch_op.alter_column('groups_str', new_column_name='groups')
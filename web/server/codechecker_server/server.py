@@ -797,7 +797,17 @@ class CCSimpleHttpServer(HTTPServer):
         LOG.debug("Creating database engine for CONFIG DATABASE...")
         self.__engine = product_db_sql_server.create_engine()
         self.config_session = sessionmaker(bind=self.__engine)
-        self.manager.set_database_connection(self.config_session)
+
+        # Session handling runs short transactions on almost every request,
+        # so the session manager reuses connections from a small pool. The
+        # engine is not connected until the first request, which is served
+        # after the worker processes are forked.
+        self.__session_engine = product_db_sql_server.create_engine(
+            pool_size=session_manager.SESSION_DB_POOL_SIZE,
+            max_overflow=session_manager.SESSION_DB_MAX_OVERFLOW,
+            pool_recycle=session_manager.SESSION_DB_POOL_RECYCLE)
+        self.manager.set_database_connection(
+            sessionmaker(bind=self.__session_engine))
 
         # Load the initial list of products and set up the server.
         cfg_sess = self.config_session()
@@ -899,6 +909,7 @@ class CCSimpleHttpServer(HTTPServer):
         try:
             self.server_close()
             self.__engine.dispose()
+            self.__session_engine.dispose()
         except Exception as ex:
             LOG.error("Failed to shut down the WEB server!")
             LOG.error(str(ex))
@@ -10,13 +10,19 @@ Handles the management of authentication sessions on the server's side.
 """
 
 import json
-import os
+import random
 import re
-import uuid
+import secrets
+import threading
+import time
 
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from typing import Optional
 
+from sqlalchemy.sql.expression import and_
+
 from codechecker_common.compatibility.multiprocessing import cpu_count
 from codechecker_common.logger import get_logger
 from codechecker_common.util import load_json
@@ -26,6 +32,7 @@ from codechecker_web.shared.version import SESSION_COOKIE_NAME as _SCN
 
 from .database.config_db_model import Session as SessionRecord
 from .database.config_db_model import SystemPermission
+from .database.database import DBSession
 from .permissions import SUPERUSER
 
 
@@ -45,12 +52,68 @@ except ImportError:
 LOG = get_logger("server")
 SESSION_COOKIE_NAME = _SCN
 
+# Format of the tokens returned by generate_session_token().
+SESSION_TOKEN_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+# Maximum number of sessions kept in the memory of a server process. The
+# least recently used sessions over this limit are reloaded from the database
+# when they are used again.
+MAX_LOCAL_SESSIONS = 10000
+
+# Number of threads writing the last access time of sessions to the database.
+SESSION_DB_WRITER_THREADS = 4
+
+# Connection pool of the session manager in each server process. One
+# connection is kept open for the request thread. The background cleanup and
+# the writer threads open further ones only while they are working.
+SESSION_DB_POOL_SIZE = 1
+SESSION_DB_MAX_OVERFLOW = 1 + SESSION_DB_WRITER_THREADS
+SESSION_DB_POOL_RECYCLE = 3600
+
+# Upper bound (in seconds) on how stale the last access time of a session
+# stored in the database may become before it is written again.
+SESSION_DB_UPDATE_INTERVAL = 60
+
 
 def generate_session_token():
     """
     Returns a random session token.
     """
-    return uuid.UUID(bytes=os.urandom(16)).hex
+    return secrets.token_hex(16)
+
+
+def is_session_token(token):
+    """
+    Returns whether the given string has the format of a token generated by
+    the server. Strings failing this check can not belong to any session.
+    """
+    return bool(token) and SESSION_TOKEN_PATTERN.fullmatch(token) is not None
+
+
+def parse_auth_string(auth_string):
+    """
+    Split the given 'username:password' authentication string.
+
+    Returns a (username, password) tuple or None if the authentication string
+    is missing or does not contain a colon.
+    """
+    if not auth_string:
+        return None
+
+    username, sep, password = auth_string.partition(':')
+    if not sep:
+        return None
+
+    return username, password
+
+
+def get_db_update_interval(session_lifetime):
+    """
+    Returns the number of seconds which has to pass between two writes of a
+    session's last access time to the database. The stored timestamp may lag
+    behind the real last access of the session by this much.
+    """
+    return min(SESSION_DB_UPDATE_INTERVAL, session_lifetime / 10)
 
 
 def get_worker_processes(scfg_dict):
@@ -76,7 +139,7 @@ class _Session:
 
     def __init__(self, token, username, groups,
                  session_lifetime, refresh_time, is_root=False, database=None,
-                 last_access=None, can_expire=True):
+                 last_access=None, can_expire=True, executor=None):
 
         self.token = token
         self.user = username
@@ -86,9 +149,23 @@ class _Session:
         self.refresh_time = refresh_time if refresh_time else None
         self.__root = is_root
         self.__database = database
+        self.__executor = executor
         self.__can_expire = can_expire
         self.last_access = last_access if last_access else datetime.now()
 
+        # Expiry checks run on every request, so they are done on the
+        # monotonic clock. The wall-clock 'last_access' is only kept for
+        # storing in the database.
+        elapsed = max((datetime.now() - self.last_access).total_seconds(), 0)
+        self.__last_db_write = time.monotonic() - elapsed
+
+        # A last access time loaded from the database may lag behind the
+        # real last use of the session by the database update interval, so
+        # the session is given that much grace.
+        if last_access:
+            elapsed = max(elapsed - self.db_update_interval, 0)
+        self.__last_access_time = time.monotonic() - elapsed
+
     @property
     def is_root(self):
         """Returns whether or not the Session was created with the master
@@ -103,8 +180,7 @@ class _Session:
         if not self.refresh_time:
             return True
 
-        return (datetime.now() - self.last_access).total_seconds() > \
-            self.refresh_time
+        return time.monotonic() - self.__last_access_time > self.refresh_time
 
     @property
     def is_alive(self):
@@ -115,7 +191,7 @@ class _Session:
         if not self.__can_expire:
             return True
 
-        return (datetime.now() - self.last_access).total_seconds() <= \
+        return time.monotonic() - self.__last_access_time <= \
             self.session_lifetime
 
     @property
@@ -127,6 +203,14 @@ class _Session:
         """
         return self.__can_expire
 
+    @property
+    def db_update_interval(self):
+        """
+        Returns the number of seconds which has to pass between two writes of
+        the session's last access time to the database.
+        """
+        return get_db_update_interval(self.session_lifetime)
+
     def revalidate(self):
         """
         A session is only revalidated if it has yet to exceed its
@@ -139,28 +223,43 @@ class _Session:
             return
 
         if self.__database and self.is_refresh_time_expire:
+            now = time.monotonic()
+            self.__last_access_time = now
             self.last_access = datetime.now()
 
-            # Update the timestamp in the database for the session's last
-            # access.
-            transaction = None
-            try:
-                transaction = self.__database()
+            # Other server processes only see the timestamp stored in the
+            # database, so it is enough to keep it reasonably up to date
+            # instead of writing it on every request.
+            if now - self.__last_db_write < self.db_update_interval:
+                return
+
+            self.__last_db_write = now
+
+            # The request does not need to wait for the database write.
+            if self.__executor:
+                self.__executor.submit(self.__update_db_last_access,
+                                       self.last_access)
+            else:
+                self.__update_db_last_access(self.last_access)
+
+    def __update_db_last_access(self, last_access):
+        """
+        Update the timestamp in the database for the session's last access.
+        """
+        try:
+            with DBSession(self.__database) as transaction:
                 record = transaction.query(SessionRecord) \
                     .filter(SessionRecord.user_name == self.user) \
                     .filter(SessionRecord.token == self.token) \
                     .limit(1).one_or_none()
 
                 if record:
-                    record.last_access = self.last_access
+                    record.last_access = last_access
                     transaction.commit()
-            except Exception as e:
-                LOG.warning("Couldn't update usage timestamp of %s",
-                            self.token)
-                LOG.warning(str(e))
-            finally:
-                if transaction:
-                    transaction.close()
+        except Exception as e:
+            LOG.warning("Couldn't update usage timestamp of %s",
+                        self.token)
+            LOG.warning(str(e))
 
 
 class SessionManager:
@@ -179,8 +278,12 @@ class SessionManager:
             configuration file disables authentication.
         """
         self.__database_connection = None
-        self.__logins_since_prune = 0
-        self.__sessions = []
+        self.__sessions = OrderedDict()
+        self.__sessions_lock = threading.Lock()
+        self.__cleanup_executor = ThreadPoolExecutor(max_workers=1)
+        self.__db_executor = ThreadPoolExecutor(
+            max_workers=SESSION_DB_WRITER_THREADS)
+        self.__cleanup_future = None
         self.__configuration_file = configuration_file
 
         scfg_dict = self.__get_config_dict()
@@ -203,9 +306,6 @@ class SessionManager:
             LOG.debug("Found deprecated argument 'soft_expire' in "
                       "server_config.authentication.")
 
-        self.__refresh_time = self.__auth_config['refresh_time'] \
-            if 'refresh_time' in self.__auth_config else None
-
         self.__regex_groups_enabled = False
 
         # Pre-compile the regular expressions of 'regex_groups'
@@ -220,35 +320,43 @@ class SessionManager:
                 d[group_name] = [re.compile(r) for r in regex_list]
             self.__group_regexes_compiled = d
 
+        # The credentials of the dictionary method are looked up on every
+        # login attempt, so their validation objects are built in advance.
+        self.__dictionary_auths = {}
+        if 'method_dictionary' in self.__auth_config:
+            method_config = self.__auth_config['method_dictionary']
+            groups = method_config.get('groups', {})
+            for auth_string in method_config.get('auths', []):
+                username = SessionManager.get_user_name(auth_string)
+                self.__dictionary_auths[auth_string] = \
+                    (username, tuple(groups.get(username, [])))
+
+        # Which methods are usable does not change at runtime, so it is
+        # resolved once instead of on every login attempt.
+        self.__enabled_methods = frozenset()
+
         # If no methods are configured as enabled, disable authentication.
         if scfg_dict['authentication'].get('enabled'):
-            found_auth_method = False
+            enabled_methods = set()
 
-            if 'method_dictionary' in self.__auth_config and \
-                    self.__auth_config['method_dictionary'].get('enabled'):
-                found_auth_method = True
+            for method in ('dictionary', 'ldap', 'pam'):
+                method_config = self.__auth_config.get('method_' + method)
+                if not method_config or not method_config.get('enabled'):
+                    continue
 
-            if 'method_ldap' in self.__auth_config and \
-                    self.__auth_config['method_ldap'].get('enabled'):
-                if 'ldap' not in UNSUPPORTED_METHODS:
-                    found_auth_method = True
-                else:
-                    LOG.warning("LDAP authentication was enabled but "
+                if method in UNSUPPORTED_METHODS:
+                    LOG.warning("%s authentication was enabled but "
                                 "prerequisites are NOT installed on the system"
-                                "... Disabling LDAP authentication.")
-                    self.__auth_config['method_ldap']['enabled'] = False
+                                "... Disabling %s authentication.",
+                                method.upper(), method.upper())
+                    method_config['enabled'] = False
+                    continue
 
-            if 'method_pam' in self.__auth_config and \
-                    self.__auth_config['method_pam'].get('enabled'):
-                if 'pam' not in UNSUPPORTED_METHODS:
-                    found_auth_method = True
-                else:
-                    LOG.warning("PAM authentication was enabled but "
-                                "prerequisites are NOT installed on the system"
-                                "... Disabling PAM authentication.")
-                    self.__auth_config['method_pam']['enabled'] = False
+                enabled_methods.add(method)
 
-            if not found_auth_method:
+            self.__enabled_methods = frozenset(enabled_methods)
+
+            if not self.__enabled_methods:
                 if force_auth:
                     LOG.warning("Authentication was manually enabled, but no "
                                 "valid authentication backends are "
@@ -260,6 +368,19 @@ class SessionManager:
                                 "Falling back to no authentication.")
                     self.__auth_config['enabled'] = False
 
+        self.__update_auth_options()
+
+    def __update_auth_options(self):
+        """
+        Copy the authentication options which are read on every request from
+        the configuration dict to attributes.
+        """
+        self.__enabled = bool(self.__auth_config.get('enabled'))
+        self.__session_lifetime = self.__auth_config.get('session_lifetime')
+        self.__refresh_time = self.__auth_config.get('refresh_time')
+        self.__logins_until_cleanup = \
+            self.__auth_config.get('logins_until_cleanup')
+
     def __get_config_dict(self):
         """
         Get server config information from the configuration file. Raise
@@ -312,12 +433,16 @@ class SessionManager:
                         update_sessions = True
 
             if update_sessions:
+                self.__update_auth_options()
+
                 # Update configuration options of the already existing
                 # sessions.
-                for session in self.__sessions:
-                    session.session_lifetime = \
-                        self.__auth_config['session_lifetime']
-                    session.refresh_time = self.__auth_config['refresh_time']
+                with self.__sessions_lock:
+                    sessions = list(self.__sessions.values())
+
+                for session in sessions:
+                    session.session_lifetime = self.__session_lifetime
+                    session.refresh_time = self.__refresh_time
 
             LOG.info("Done.")
         except ValueError as ex:
@@ -326,7 +451,7 @@ class SessionManager:
 
     @property
     def is_enabled(self):
-        return self.__auth_config.get('enabled')
+        return self.__enabled
 
     @property
     def worker_processes(self):
@@ -358,19 +483,24 @@ class SessionManager:
         """
         self.__database_connection = connection
 
-    def __handle_validation(self, auth_string):
+    def __handle_validation(self, auth_string, credentials):
         """
         Validate an oncoming authorization request
         against some authority controller.
 
+        The credentials parameter is the auth_string split by
+        parse_auth_string(). Methods requiring a user name and a password are
+        skipped if it is None.
+
         Returns False if no validation was done, or a validation object
         if the user was successfully authenticated.
 
         This validation object contains two keys: username and groups.
         """
-        validation = self.__try_auth_dictionary(auth_string) \
-            or self.__try_auth_pam(auth_string) \
-            or self.__try_auth_ldap(auth_string)
+        validation = self.__try_auth_dictionary(auth_string)
+        if not validation and credentials:
+            validation = self.__try_auth_pam(credentials) \
+                or self.__try_auth_ldap(credentials)
         if not validation:
             return False
 
@@ -384,37 +514,33 @@ class SessionManager:
         LOG.debug('User validation details: %s', str(validation))
         return validation
 
-    def __is_method_enabled(self, method):
-        return method not in UNSUPPORTED_METHODS and \
-            'method_' + method in self.__auth_config and \
-            self.__auth_config['method_' + method].get('enabled')
-
-    def __try_auth_token(self, auth_string):
+    def __try_auth_token(self, credentials):
         if not self.__database_connection:
             return None
 
-        user_name, token = auth_string.split(':', 1)
+        user_name, token = credentials
+
+        # Passwords of other authentication methods can be told apart from
+        # personal access tokens without querying the database.
+        if not is_session_token(token):
+            return None
 
-        transaction = None
         try:
             # Try the database, if it is connected.
-            transaction = self.__database_connection()
-            auth_session = transaction.query(SessionRecord.token) \
-                .filter(SessionRecord.user_name == user_name) \
-                .filter(SessionRecord.token == token) \
-                .filter(SessionRecord.can_expire.is_(False)) \
-                .limit(1).one_or_none()
+            with DBSession(self.__database_connection) as transaction:
+                auth_session = transaction.query(SessionRecord.token) \
+                    .filter(SessionRecord.user_name == user_name) \
+                    .filter(SessionRecord.token == token) \
+                    .filter(SessionRecord.can_expire.is_(False)) \
+                    .limit(1).one_or_none()
 
-            if not auth_session:
-                return None
+                if not auth_session:
+                    return None
 
-            return auth_session
+                return auth_session
         except Exception as e:
             LOG.error("Couldn't check login in the database: ")
             LOG.error(str(e))
-        finally:
-            if transaction:
-                transaction.close()
 
         return None
 
@@ -425,31 +551,28 @@ class SessionManager:
         Returns a validation object if successful, which contains the users'
         groups.
         """
-        method_config = self.__auth_config.get('method_dictionary')
-        if not method_config:
+        if 'dictionary' not in self.__enabled_methods:
             return False
 
-        valid = self.__is_method_enabled('dictionary') and \
-            auth_string in method_config.get('auths')
-        if not valid:
+        validation = self.__dictionary_auths.get(auth_string)
+        if not validation:
             return False
 
-        username = SessionManager.get_user_name(auth_string)
-        group_list = method_config['groups'][username] if \
-            'groups' in method_config and \
-            username in method_config['groups'] else []
+        username, groups = validation
 
+        # Every session gets its own copy of the groups, so the configuration
+        # can not be changed through them.
         return {
             'username': username,
-            'groups': group_list
+            'groups': list(groups)
         }
 
-    def __try_auth_pam(self, auth_string):
+    def __try_auth_pam(self, credentials):
         """
         Try to authenticate user based on the PAM configuration.
         """
-        if self.__is_method_enabled('pam'):
-            username, password = auth_string.split(':', 1)
+        if 'pam' in self.__enabled_methods:
+            username, password = credentials
             if cc_pam.auth_user(self.__auth_config['method_pam'],
                                 username, password):
                 # PAM does not hold a group membership list we can reliably
@@ -458,12 +581,12 @@ class SessionManager:
 
         return False
 
-    def __try_auth_ldap(self, auth_string):
+    def __try_auth_ldap(self, credentials):
         """
         Try to authenticate user to all the configured authorities.
         """
-        if self.__is_method_enabled('ldap'):
-            username, password = auth_string.split(':', 1)
+        if 'ldap' in self.__enabled_methods:
+            username, password = credentials
 
             ldap_authorities = self.__auth_config['method_ldap'] \
                 .get('authorities')
@@ -482,21 +605,17 @@ class SessionManager:
         if not self.__database_connection:
             return None
 
-        transaction = None
         try:
             # Try the database, if it is connected.
-            transaction = self.__database_connection()
-            transaction.query(SessionRecord) \
-                .filter(SessionRecord.user_name == user_name) \
-                .update({SessionRecord.groups: ';'.join(groups)})
-            transaction.commit()
-            return True
+            with DBSession(self.__database_connection) as transaction:
+                transaction.query(SessionRecord) \
+                    .filter(SessionRecord.user_name == user_name) \
+                    .update({SessionRecord.groups: groups})
+                transaction.commit()
+                return True
         except Exception as e:
             LOG.error("Couldn't check login in the database: ")
             LOG.error(str(e))
-        finally:
-            if transaction:
-                transaction.close()
 
         return False
 
@@ -521,28 +640,26 @@ class SessionManager:
     def get_user_name(auth_string):
         return auth_string.split(':')[0]
 
-    def get_db_auth_session_tokens(self, user_name):
+    def get_db_auth_session_token(self, user_name):
         """
-        Get authentication session token from the database for the given user.
+        Get the most recently used authentication session token from the
+        database for the given user.
         """
         if not self.__database_connection:
             return None
 
-        transaction = None
         try:
             # Try the database, if it is connected.
-            transaction = self.__database_connection()
-            session_tokens = transaction.query(SessionRecord) \
-                .filter(SessionRecord.user_name == user_name) \
-                .filter(SessionRecord.can_expire.is_(True)) \
-                .all()
-            return session_tokens
+            with DBSession(self.__database_connection) as transaction:
+                session_token = transaction.query(SessionRecord.token) \
+                    .filter(SessionRecord.user_name == user_name) \
+                    .filter(SessionRecord.can_expire.is_(True)) \
+                    .order_by(SessionRecord.last_access.desc()) \
+                    .first()
+                return session_token.token if session_token else None
         except Exception as e:
             LOG.error("Couldn't check login in the database: ")
             LOG.error(str(e))
-        finally:
-            if transaction:
-                transaction.close()
 
         return None
 
@@ -554,59 +671,63 @@ class SessionManager:
         if self.__auth_config['super_user'] == user_name:
             return True
 
-        transaction = None
+        if not self.__database_connection:
+            return False
+
         try:
             # Try the database, if it is connected.
-            transaction = self.__database_connection()
-            system_permission = transaction.query(SystemPermission) \
-                .filter(SystemPermission.name == user_name) \
-                .filter(SystemPermission.permission == SUPERUSER.name) \
-                .limit(1).one_or_none()
-            return bool(system_permission)
+            with DBSession(self.__database_connection) as transaction:
+                system_permission = transaction.query(SystemPermission) \
+                    .filter(SystemPermission.name == user_name) \
+                    .filter(SystemPermission.permission == SUPERUSER.name) \
+                    .limit(1).one_or_none()
+                return bool(system_permission)
         except Exception as e:
             LOG.error("Couldn't get system permission from database: ")
             LOG.error(str(e))
-        finally:
-            if transaction:
-                transaction.close()
 
         return False
 
-    def __create_local_session(self, token, user_name, groups, is_root,
+    def __create_local_session(self, token, user_name, groups, is_root=None,
                                last_access=None, can_expire=True):
         """
         Returns a new local session object initalized by the given parameters.
+
+        If is_root is None, the system permissions of the user are looked up
+        in the database.
         """
-        if not is_root:
+        if is_root is None:
             is_root = self.__is_root_user(user_name)
 
         return _Session(
             token, user_name, groups,
-            self.__auth_config['session_lifetime'],
+            self.__session_lifetime,
             self.__refresh_time, is_root, self.__database_connection,
-            last_access, can_expire)
+            last_access, can_expire, self.__db_executor)
 
     def create_session(self, auth_string):
         """ Creates a new session for the given auth-string. """
-        if not self.__auth_config['enabled']:
+        if not self.__enabled:
             return None
 
-        # Perform cleanup of session memory, if neccessary.
-        self.__logins_since_prune += 1
-        if self.__logins_since_prune >= \
-                self.__auth_config['logins_until_cleanup']:
-            self.__cleanup_sessions()
+        # Perform cleanup of session memory once in every
+        # 'logins_until_cleanup' logins on average.
+        if random.random() * self.__logins_until_cleanup < 1:
+            self.__schedule_cleanup()
+
+        credentials = parse_auth_string(auth_string)
 
         # Try authenticate user with personal access token.
-        auth_token = self.__try_auth_token(auth_string)
+        auth_token = self.__try_auth_token(credentials) \
+            if credentials else None
         if auth_token:
             local_session = self.__get_local_session_from_db(auth_token.token)
             local_session.revalidate()
-            self.__sessions.append(local_session)
+            self.__add_local_session(local_session)
             return local_session
 
         # Try to authenticate user with different authentication methods.
-        validation = self.__handle_validation(auth_string)
+        validation = self.__handle_validation(auth_string, credentials)
         if not validation:
             return False
 
@@ -614,28 +735,23 @@ class SessionManager:
         token = generate_session_token()
         user_name = validation.get('username')
         groups = validation.get('groups', [])
-        is_root = validation.get('root', False)
+        is_root = validation.get('root') or None
 
         local_session = self.__create_local_session(token, user_name,
                                                     groups, is_root)
-        self.__sessions.append(local_session)
+        self.__add_local_session(local_session)
 
         # Store the session in the database.
-        transaction = None
         if self.__database_connection:
             try:
-                transaction = self.__database_connection()
-                record = SessionRecord(token, user_name,
-                                       ';'.join(groups))
-                transaction.add(record)
-                transaction.commit()
+                with DBSession(self.__database_connection) as transaction:
+                    record = SessionRecord(token, user_name, groups)
+                    transaction.add(record)
+                    transaction.commit()
             except Exception as e:
                 LOG.error("Couldn't store or update login record in "
                           "database:")
                 LOG.error(str(e))
-            finally:
-                if transaction:
-                    transaction.close()
 
         return local_session
 
@@ -698,31 +814,36 @@ class SessionManager:
         if not self.__database_connection:
             return None
 
-        transaction = None
         try:
-            transaction = self.__database_connection()
-            db_record = transaction.query(SessionRecord) \
-                .filter(SessionRecord.token == token) \
-                .limit(1).one_or_none()
-
-            if db_record:
-                user_name = db_record.user_name
-                is_root = self.__is_root_user(user_name)
-
-                groups = db_record.groups.split(';') \
-                    if db_record.groups else []
-
-                return self.__create_local_session(token, user_name,
-                                                   groups,
-                                                   is_root,
-                                                   db_record.last_access,
-                                                   db_record.can_expire)
+            # Fetch the superuser permission of the session's owner in the
+            # same round-trip.
+            with DBSession(self.__database_connection) as transaction:
+                row = transaction.query(SessionRecord, SystemPermission) \
+                    .outerjoin(SystemPermission,
+                               and_(SystemPermission.name ==
+                                    SessionRecord.user_name,
+                                    SystemPermission.permission ==
+                                    SUPERUSER.name)) \
+                    .filter(SessionRecord.token == token) \
+                    .limit(1).one_or_none()
+
+                if row:
+                    db_record, system_permission = row
+                    user_name = db_record.user_name
+                    is_root = 'super_user' in self.__auth_config and \
+                        (self.__auth_config['super_user'] == user_name or
+                         system_permission is not None)
+
+                    groups = db_record.groups or []
+
+                    return self.__create_local_session(token, user_name,
+                                                       groups,
+                                                       is_root,
+                                                       db_record.last_access,
+                                                       db_record.can_expire)
         except Exception as e:
             LOG.error("Couldn't check login in the database: ")
             LOG.error(str(e))
-        finally:
-            if transaction:
-                transaction.close()
 
         return None
 
@@ -739,49 +860,69 @@ class SessionManager:
         if not self.is_enabled:
             return None
 
-        for sess in self.__sessions:
-            if sess.is_alive and sess.token == token:
-                # If the session is alive but the should be re-validated.
-                if sess.is_refresh_time_expire:
-                    sess.revalidate()
-                return sess
+        if not is_session_token(token):
+            return None
+
+        with self.__sessions_lock:
+            sess = self.__sessions.get(token)
+            if sess:
+                self.__sessions.move_to_end(token)
+
+        if sess and sess.is_alive:
+            # If the session is alive but the should be re-validated.
+            if sess.is_refresh_time_expire:
+                sess.revalidate()
+            return sess
 
         # Try to get a local session from the database.
         local_session = self.__get_local_session_from_db(token)
         if local_session and local_session.is_alive:
-            self.__sessions.append(local_session)
+            self.__add_local_session(local_session)
             if local_session.is_refresh_time_expire:
                 local_session.revalidate()
             return local_session
 
-        self.invalidate(token)
+        self.invalidate_local_session(token)
+
+        # Only an expired session has to be deleted from the database. If the
+        # token is not stored there, a DELETE would be a wasted round-trip.
+        if local_session:
+            self.__remove_expired_db_sessions([token])
 
         return None
 
+    def __add_local_session(self, session):
+        """
+        Add the given session to the local in memory store. If the store grows
+        over MAX_LOCAL_SESSIONS, the least recently used sessions are dropped.
+        """
+        with self.__sessions_lock:
+            self.__sessions[session.token] = session
+            self.__sessions.move_to_end(session.token)
+
+            while len(self.__sessions) > MAX_LOCAL_SESSIONS:
+                self.__sessions.popitem(last=False)
+
     def invalidate_local_session(self, token):
         """
         Remove a user's previous session from the local in memory store.
         """
-        for session in self.__sessions[:]:
-            if session.token == token:
-                self.__sessions.remove(session)
-                return True
-        return False
+        with self.__sessions_lock:
+            return self.__sessions.pop(token, None) is not None
 
     def invalidate(self, token):
         """
         Remove a user's previous session from local in memory and the database
         store.
         """
-        transaction = None
-        try:
-            self.invalidate_local_session(token)
+        self.invalidate_local_session(token)
 
-            transaction = self.__database_connection() \
-                if self.__database_connection else None
+        if not self.__database_connection:
+            return True
 
+        try:
             # Remove sessions from the database.
-            if transaction:
+            with DBSession(self.__database_connection) as transaction:
                 transaction.query(SessionRecord) \
                     .filter(SessionRecord.token == token) \
                     .filter(SessionRecord.can_expire.is_(True)) \
@@ -792,19 +933,64 @@ class SessionManager:
         except Exception as e:
             LOG.error("Couldn't invalidate session for token %s", token)
             LOG.error(str(e))
-        finally:
-            if transaction:
-                transaction.close()
 
         return False
 
+    def __schedule_cleanup(self):
+        """
+        Run the cleanup of the sessions in the background, so the login
+        request which triggered it does not have to wait for it. A new
+        cleanup is not scheduled while the previous one is still pending.
+        """
+        if self.__cleanup_future and not self.__cleanup_future.done():
+            return
+
+        self.__cleanup_future = \
+            self.__cleanup_executor.submit(self.__cleanup_sessions)
+
     def __cleanup_sessions(self):
-        self.__logins_since_prune = 0
+        # Drop the sessions which are expired or have to be refreshed from
+        # the database from the memory in a single pass, and collect the
+        # ones expired in this process as candidates for removal from the
+        # database.
+        dead_tokens = []
+        with self.__sessions_lock:
+            for token, session in list(self.__sessions.items()):
+                if not session.is_alive:
+                    dead_tokens.append(token)
+                elif not session.is_refresh_time_expire:
+                    continue
 
-        for s in self.__sessions:
-            if s.is_refresh_time_expire:
-                self.invalidate_local_session(s.token)
+                del self.__sessions[token]
 
-        for s in self.__sessions:
-            if not s.is_alive:
-                self.invalidate(s.token)
+        if dead_tokens:
+            self.__remove_expired_db_sessions(dead_tokens)
+
+    def __remove_expired_db_sessions(self, tokens):
+        """
+        Remove the given sessions from the database if their stored last
+        access time is expired.
+        """
+        if not self.__database_connection:
+            return
+
+        # Other server processes may still use a session which expired in
+        # the memory of this one, so only the sessions whose stored last
+        # access time is expired too are removed. The stored timestamp may
+        # lag behind by the database update interval.
+        expired_before = datetime.now() - timedelta(
+            seconds=self.__session_lifetime +
+            get_db_update_interval(self.__session_lifetime))
+
+        try:
+            # Remove the expired sessions from the database in one batch.
+            with DBSession(self.__database_connection) as transaction:
+                transaction.query(SessionRecord) \
+                    .filter(SessionRecord.token.in_(tokens)) \
+                    .filter(SessionRecord.can_expire.is_(True)) \
+                    .filter(SessionRecord.last_access < expired_before) \
+                    .delete(synchronize_session=False)
+                transaction.commit()
+        except Exception as e:
+            LOG.error("Couldn't remove expired sessions from the database")
+            LOG.error(str(e))
@@ -0,0 +1,460 @@
+# -------------------------------------------------------------------------
+#
+#  Part of the CodeChecker project, under the Apache License v2.0 with
+#  LLVM Exceptions. See LICENSE for license information.
+#  SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# -------------------------------------------------------------------------
+
+""" Unit tests for the session_manager module. """
+
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from codechecker_server.database.config_db_model import Base, \
+    Session as SessionRecord, SystemPermission
+from codechecker_server import session_manager
+from codechecker_server.permissions import SUPERUSER
+from codechecker_server.session_manager import SessionManager, \
+    generate_session_token, get_db_update_interval, is_session_token, \
+    parse_auth_string
+
+SESSION_LIFETIME = 300
+
+
+class AuthStringTest(unittest.TestCase):
+    """
+    Testing the helpers checking the format of authentication strings.
+    """
+
+    def test_session_token_shape(self):
+        """ Only 32 lowercase hex characters form a session token. """
+        self.assertTrue(is_session_token(generate_session_token()))
+        self.assertTrue(is_session_token('0123456789abcdef' * 2))
+
+        self.assertFalse(is_session_token('0123456789ABCDEF' * 2))
+        self.assertFalse(is_session_token('0123456789abcdef'))
+        self.assertFalse(is_session_token('0123456789abcdef' * 2 + '0'))
+        self.assertFalse(is_session_token('0123456789abcdeg' * 2))
+        self.assertFalse(is_session_token('0123456789abcdef' * 2 + '\n'))
+        self.assertFalse(is_session_token('user:pass'))
+
+    def test_session_token_missing(self):
+        """ Missing tokens are not session tokens. """
+        self.assertFalse(is_session_token(None))
+        self.assertFalse(is_session_token(''))
+
+    def test_parse_auth_string(self):
+        """ The user name ends at the first colon. """
+        self.assertEqual(parse_auth_string('user:pass'), ('user', 'pass'))
+        self.assertEqual(parse_auth_string('user:pa:ss:'),
+                         ('user', 'pa:ss:'))
+        self.assertEqual(parse_auth_string('user:'), ('user', ''))
+        self.assertEqual(parse_auth_string(':pass'), ('', 'pass'))
+
+    def test_parse_auth_string_without_colon(self):
+        """ Malformed authentication strings can not be parsed. """
+        self.assertIsNone(parse_auth_string('userpass'))
+        self.assertIsNone(parse_auth_string(generate_session_token()))
+        self.assertIsNone(parse_auth_string(''))
+        self.assertIsNone(parse_auth_string(None))
+
+
+class SessionManagerTest(unittest.TestCase):
+    """
+    Testing the session manager of server processes sharing a database.
+    """
+
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+
+        self.config_file = os.path.join(self.workspace, 'server_config.json')
+        self.__write_config()
+        self.managers = []
+
+        engine = create_engine(
+            'sqlite:///' + os.path.join(self.workspace, 'config.sqlite'),
+            connect_args={'check_same_thread': False},
+            poolclass=NullPool)
+        Base.metadata.create_all(engine)
+        self.db_session = sessionmaker(bind=engine)
+
+    def tearDown(self):
+        # Wait for the background database writes before removing the
+        # database.
+        # pylint: disable=protected-access
+        for manager in self.managers:
+            manager._SessionManager__cleanup_executor.shutdown(wait=True)
+            manager._SessionManager__db_executor.shutdown(wait=True)
+
+        shutil.rmtree(self.workspace)
+
+    def __write_config(self, **auth_options):
+        """ Write the server configuration with the given auth options. """
+        authentication = {
+            "enabled": True,
+            "session_lifetime": SESSION_LIFETIME,
+            "refresh_time": 60,
+            "logins_until_cleanup": 30,
+            "method_dictionary": {
+                "enabled": True,
+                "auths": ["user:pass"],
+                "groups": {"user": ["group"]}
+            }
+        }
+        authentication.update(auth_options)
+
+        with open(self.config_file, 'w', encoding='utf-8') as f:
+            json.dump({"authentication": authentication}, f)
+        os.chmod(self.config_file, 0o600)
+
+    def __create_manager(self):
+        """ Create a session manager, like a server worker process does. """
+        manager = SessionManager(self.config_file)
+        manager.set_database_connection(self.db_session)
+        self.managers.append(manager)
+        return manager
+
+    def __get_record(self, token):
+        db = self.db_session()
+        try:
+            return db.query(SessionRecord) \
+                .filter(SessionRecord.token == token) \
+                .one_or_none()
+        finally:
+            db.close()
+
+    def __set_record_last_access(self, token, last_access):
+        db = self.db_session()
+        try:
+            db.query(SessionRecord) \
+                .filter(SessionRecord.token == token) \
+                .update({SessionRecord.last_access: last_access})
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def __expire_local_session(session):
+        """ Make the in-memory copy of the session stale. """
+        # pylint: disable=protected-access
+        session._Session__last_access_time -= SESSION_LIFETIME + 1
+
+    def test_cleanup_keeps_session_used_by_other_process(self):
+        """
+        A session which expired in the memory of one process, but is still
+        used by another one, is not removed from the database.
+        """
+        manager_a = self.__create_manager()
+        manager_b = self.__create_manager()
+
+        session = manager_a.create_session("user:pass")
+        self.assertIsNotNone(manager_b.get_session(session.token))
+
+        self.__expire_local_session(session)
+        # pylint: disable=protected-access
+        manager_a._SessionManager__cleanup_sessions()
+
+        self.assertIsNotNone(self.__get_record(session.token))
+        self.assertIsNotNone(
+            self.__create_manager().get_session(session.token))
+
+    def test_cleanup_removes_expired_session(self):
+        """
+        A session whose stored last access time is expired too is removed
+        from the database.
+        """
+        manager = self.__create_manager()
+
+        session = manager.create_session("user:pass")
+        self.__set_record_last_access(
+            session.token,
+            datetime.now() - timedelta(seconds=2 * SESSION_LIFETIME))
+
+        self.__expire_local_session(session)
+        # pylint: disable=protected-access
+        manager._SessionManager__cleanup_sessions()
+
+        self.assertIsNone(self.__get_record(session.token))
+
+    def test_dictionary_groups_not_shared(self):
+        """
+        Sessions of dictionary users do not share their list of groups with
+        each other.
+        """
+        manager = self.__create_manager()
+
+        first = manager.create_session("user:pass")
+        first.groups.append('mutated')
+
+        second = manager.create_session("user:pass")
+        self.assertEqual(second.groups, ['group'])
+
+    def test_local_sessions_evicted_in_lru_order(self):
+        """
+        The least recently used session is dropped from the full local store
+        and is reloaded from the database on its next use.
+        """
+        manager = self.__create_manager()
+        # pylint: disable=protected-access
+        local_sessions = manager._SessionManager__sessions
+
+        with mock.patch.object(session_manager, 'MAX_LOCAL_SESSIONS', 2):
+            first = manager.create_session("user:pass")
+            second = manager.create_session("user:pass")
+
+            # Using the first session makes the second one the oldest.
+            self.assertIs(manager.get_session(first.token), first)
+
+            third = manager.create_session("user:pass")
+            self.assertEqual(list(local_sessions),
+                             [first.token, third.token])
+
+            reloaded = manager.get_session(second.token)
+            self.assertIsNotNone(reloaded)
+            self.assertIsNot(reloaded, second)
+            self.assertEqual(reloaded.user, 'user')
+            self.assertEqual(reloaded.groups, ['group'])
+            self.assertEqual(list(local_sessions),
+                             [third.token, second.token])
+
+    def test_lagging_db_last_access_in_other_process(self):
+        """
+        A session still used by another process is not deleted when its
+        stored last access time lags behind its real last use.
+        """
+        self.__write_config(refresh_time=None)
+        manager_a = self.__create_manager()
+        manager_b = self.__create_manager()
+
+        session = manager_a.create_session("user:pass")
+        self.assertIsNotNone(manager_b.get_session(session.token))
+
+        # The session was last used 285 seconds ago by the other process,
+        # but the last access time was written 310 seconds ago.
+        self.__set_record_last_access(
+            session.token,
+            datetime.now() - timedelta(seconds=SESSION_LIFETIME + 10))
+        self.__expire_local_session(session)
+
+        self.assertIsNotNone(manager_a.get_session(session.token))
+        self.assertIsNotNone(self.__get_record(session.token))
+        self.assertIsNotNone(manager_b.get_session(session.token))
+
+    def test_lagging_db_last_access_after_cleanup(self):
+        """
+        A session dropped from the memory by a cleanup is not deleted when it
+        is reloaded with a lagging stored last access time.
+        """
+        self.__write_config(refresh_time=None)
+        manager = self.__create_manager()
+
+        session = manager.create_session("user:pass")
+        self.__set_record_last_access(
+            session.token,
+            datetime.now() - timedelta(seconds=SESSION_LIFETIME + 10))
+
+        # Without a refresh time every session is dropped from the memory.
+        # pylint: disable=protected-access
+        manager._SessionManager__cleanup_sessions()
+        self.assertFalse(manager.invalidate_local_session(session.token))
+
+        self.assertIsNotNone(manager.get_session(session.token))
+        self.assertIsNotNone(self.__get_record(session.token))
+
+    def test_get_session_removes_expired_session(self):
+        """
+        A session whose stored last access time is expired is removed from
+        the database when it is used.
+        """
+        manager = self.__create_manager()
+
+        session = manager.create_session("user:pass")
+        self.__set_record_last_access(
+            session.token,
+            datetime.now() - timedelta(seconds=2 * SESSION_LIFETIME))
+        self.__expire_local_session(session)
+
+        self.assertIsNone(manager.get_session(session.token))
+        self.assertIsNone(self.__get_record(session.token))
+
+    def test_get_session_keeps_session_refreshed_by_other_process(self):
+        """
+        A session judged as expired is not removed from the database if its
+        stored last access time was updated in the meantime.
+        """
+        manager = self.__create_manager()
+        session = manager.create_session("user:pass")
+        self.__expire_local_session(session)
+
+        # pylint: disable=protected-access
+        with mock.patch.object(session_manager._Session, 'is_alive',
+                               new_callable=mock.PropertyMock,
+                               return_value=False):
+            self.assertIsNone(manager.get_session(session.token))
+
+        self.assertIsNotNone(self.__get_record(session.token))
+
+    def test_login_schedules_cleanup_randomly(self):
+        """
+        A login schedules the cleanup with a probability of
+        1 / logins_until_cleanup.
+        """
+        manager = self.__create_manager()
+
+        # pylint: disable=protected-access
+        with mock.patch.object(session_manager.random, 'random',
+                               return_value=1 / 30):
+            manager.create_session("user:pass")
+        self.assertIsNone(manager._SessionManager__cleanup_future)
+
+        with mock.patch.object(session_manager.random, 'random',
+                               return_value=0.99 / 30):
+            manager.create_session("user:pass")
+        self.assertIsNotNone(manager._SessionManager__cleanup_future)
+
+    def test_background_cleanup_removes_expired_sessions(self):
+        """
+        The cleanup scheduled by a login removes every expired session from
+        the database in the background.
+        """
+        manager = self.__create_manager()
+
+        expired = [manager.create_session("user:pass") for _ in range(3)]
+        for session in expired:
+            self.__set_record_last_access(
+                session.token,
+                datetime.now() - timedelta(seconds=2 * SESSION_LIFETIME))
+            self.__expire_local_session(session)
+
+        with mock.patch.object(session_manager.random, 'random',
+                               return_value=0):
+            session = manager.create_session("user:pass")
+
+        # pylint: disable=protected-access
+        manager._SessionManager__cleanup_future.result(timeout=10)
+
+        for expired_session in expired:
+            self.assertIsNone(self.__get_record(expired_session.token))
+        self.assertIsNotNone(self.__get_record(session.token))
+
+    def __reload_session(self, auth_string):
+        """
+        Create a session for the given user and load it from the database
+        in another process.
+        """
+        self.__write_config(
+            super_user="root",
+            method_dictionary={
+                "enabled": True,
+                "auths": ["user:pass", "admin:pass", "root:pass"]
+            })
+
+        session = self.__create_manager().create_session(auth_string)
+        return self.__create_manager().get_session(session.token)
+
+    def test_reloaded_session_of_superuser(self):
+        """
+        A session of a user with the superuser permission is loaded from the
+        database as a root session.
+        """
+        db = self.db_session()
+        try:
+            db.add(SystemPermission(SUPERUSER.name, 'admin'))
+            db.commit()
+        finally:
+            db.close()
+
+        session = self.__reload_session("admin:pass")
+        self.assertEqual(session.user, 'admin')
+        self.assertTrue(session.is_root)
+
+    def test_reloaded_session_of_user(self):
+        """
+        A session of a user without the superuser permission is not loaded
+        from the database as a root session.
+        """
+        session = self.__reload_session("user:pass")
+        self.assertEqual(session.user, 'user')
+        self.assertFalse(session.is_root)
+
+    def test_reloaded_session_of_configured_super_user(self):
+        """
+        A session of the super user set in the configuration is loaded from
+        the database as a root session.
+        """
+        session = self.__reload_session("root:pass")
+        self.assertEqual(session.user, 'root')
+        self.assertTrue(session.is_root)
+
+    def __create_stored_session(self, seconds_since_write, executor):
+        """
+        Store a session in the database whose last access time was written
+        the given number of seconds ago, and load it without a refresh time.
+        """
+        token = self.__create_manager().create_session("user:pass").token
+        last_access = datetime.now() - timedelta(seconds=seconds_since_write)
+        self.__set_record_last_access(token, last_access)
+
+        # pylint: disable=protected-access
+        return session_manager._Session(
+            token, 'user', ['group'], SESSION_LIFETIME, None,
+            database=self.db_session, last_access=last_access,
+            executor=executor)
+
+    def test_revalidate_within_db_update_interval(self):
+        """
+        The last access time is not written to the database again within
+        the update interval.
+        """
+        executor = mock.Mock()
+        session = self.__create_stored_session(0, executor)
+        stored = self.__get_record(session.token).last_access
+
+        session.revalidate()
+
+        executor.submit.assert_not_called()
+        self.assertEqual(self.__get_record(session.token).last_access,
+                         stored)
+
+    def test_revalidate_past_db_update_interval(self):
+        """
+        Past the update interval the last access time is written to the
+        database through the executor.
+        """
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor_mock = mock.Mock(wraps=executor)
+        session = self.__create_stored_session(
+            get_db_update_interval(SESSION_LIFETIME) + 10, executor_mock)
+        stored = self.__get_record(session.token).last_access
+
+        session.revalidate()
+        executor.shutdown(wait=True)
+
+        executor_mock.submit.assert_called_once()
+        self.assertGreater(self.__get_record(session.token).last_access,
+                           stored)
+
+    def test_revalidate_without_executor(self):
+        """
+        A session without an executor writes its last access time to the
+        database synchronously.
+        """
+        session = self.__create_stored_session(
+            get_db_update_interval(SESSION_LIFETIME) + 10, None)
+        stored = self.__get_record(session.token).last_access
+
+        session.revalidate()
+
+        self.assertGreater(self.__get_record(session.token).last_access,
+                           stored)